@@ -1,3 +1,4 @@
+import asyncio
 import logging
 from dotenv import load_dotenv
 from livekit.agents import (
@@ -17,44 +18,74 @@ from livekit.agents import (
 from livekit.plugins import murf, silero, google, deepgram, noise_cancellation
 from livekit.plugins.turn_detector.multilingual import MultilingualModel
 from dataclasses import dataclass
-import json
+import time
 from datetime import datetime
-from typing import Optional
+
+import orjson
 
 logger = logging.getLogger("agent")
 load_dotenv(".env.local")
 
-@dataclass
+_INSTRUCTIONS = """You are a friendly and enthusiastic coffee shop barista at Cozy cafe. 
+
+Your main responsibilities are:
+- Greet customers warmly when they arrive
+- Take their coffee orders (espresso, latte, cappuccino, americano, cold brew, etc.)
+- Ask about size preferences (small, medium, large)
+- Offer customizations (milk type: whole, oat, almond, soy; extra shots, flavor syrups)
+- Suggest popular items or daily specials
+- Confirm orders clearly before finalizing
+- Be conversational and friendly, like a real barista
+
+Once all details are collected (name, drinkType, size, milk, extras), call save_order to complete the order.
+Avoid complex formatting, emojis, or special characters in your responses.
+
+Be helpful, upbeat, and make customers feel welcome!"""
+
+@dataclass(slots=True)
 class OrderState:
-    drinkType: Optional[str] = None
-    size: Optional[str] = None
-    milk: Optional[str] = None
+    drinkType: str | None = None
+    size: str | None = None
+    milk: str | None = None
     extras: list[str] = None
-    name: Optional[str] = None
+    name: str | None = None
 
     def __post_init__(self):
         if self.extras is None:
             self.extras = []
 
+_SPACE_TO_UNDERSCORE = str.maketrans(" ", "_")
+
+# Order writes still in flight; holds task references until they finish.
+_pending_order_writes: set[asyncio.Task] = set()
+
+def _write_json(path: str, data: dict) -> None:
+    with open(path, "wb") as f:
+        f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+
+def _save_order_file(order: dict, created: float) -> str:
+    timestamp = datetime.fromtimestamp(created).isoformat()
+    order_data = {**order, "timestamp": timestamp}
+    filename = f"order_{order['name'].translate(_SPACE_TO_UNDERSCORE)}_{timestamp.split('T')[0]}.json"
+    _write_json(filename, order_data)
+    return filename
+
+def _on_order_saved(task: asyncio.Task) -> None:
+    _pending_order_writes.discard(task)
+    if task.cancelled():
+        return
+    if task.exception() is not None:
+        logger.error(f"Failed to save order: {task.exception()}")
+        return
+    logger.info(f"Order saved to {task.result()}")
+
+async def _wait_for_order_writes() -> None:
+    if _pending_order_writes:
+        await asyncio.gather(*_pending_order_writes, return_exceptions=True)
+
 class Assistant(Agent):
     def __init__(self) -> None:
-        super().__init__(
-            instructions="""You are a friendly and enthusiastic coffee shop barista at Cozy cafe. 
-            
-            Your main responsibilities are:
-            - Greet customers warmly when they arrive
-            - Take their coffee orders (espresso, latte, cappuccino, americano, cold brew, etc.)
-            - Ask about size preferences (small, medium, large)
-            - Offer customizations (milk type: whole, oat, almond, soy; extra shots, flavor syrups)
-            - Suggest popular items or daily specials
-            - Confirm orders clearly before finalizing
-            - Be conversational and friendly, like a real barista
-            
-            Once all details are collected (name, drinkType, size, milk, extras), call save_order to complete the order.
-            Avoid complex formatting, emojis, or special characters in your responses.
-            
-            Be helpful, upbeat, and make customers feel welcome!"""
-        )
+        super().__init__(instructions=_INSTRUCTIONS)
 
     @function_tool
     async def set_name(self, context: RunContext[OrderState], name: str) -> str:
@@ -95,19 +126,17 @@ class Assistant(Agent):
             return f"Almost there! Still need: {', '.join(missing)}. Let's finish up."
 
         # Save to JSON
-        timestamp = datetime.now().isoformat()
-        order_data = {
+        order = {
             "name": state.name,
             "drinkType": state.drinkType,
             "size": state.size,
             "milk": state.milk,
-            "extras": state.extras,
-            "timestamp": timestamp
+            "extras": list(state.extras),
         }
-        filename = f"order_{state.name.replace(' ', '_')}_{timestamp.split('T')[0]}.json"
-        with open(filename, "w") as f:
-            json.dump(order_data, f, indent=2)
-        logger.info(f"Order saved to {filename}")
+        # Write in the background so the summary can be spoken right away.
+        task = asyncio.create_task(asyncio.to_thread(_save_order_file, order, time.time()))
+        _pending_order_writes.add(task)
+        task.add_done_callback(_on_order_saved)
 
         # Neat text summary
         extras_str = f" + {', '.join(state.extras)}" if state.extras else ""
@@ -117,6 +146,9 @@ class Assistant(Agent):
 
 def prewarm(proc: JobProcess):
     proc.userdata["vad"] = silero.VAD.load()
+    proc.userdata["sentence_tokenizer"] = tokenize.basic.SentenceTokenizer(min_sentence_len=2)
+    proc.userdata["stt"] = deepgram.STT(model="nova-3")
+    proc.userdata["llm"] = google.LLM(model="gemini-2.5-flash")
 
 async def entrypoint(ctx: JobContext):
     # Logging setup
@@ -128,16 +160,14 @@ async def entrypoint(ctx: JobContext):
     # Set up a voice AI pipeline
     session = AgentSession[OrderState](
         # Speech-to-text (STT)
-        stt=deepgram.STT(model="nova-3"),
+        stt=ctx.proc.userdata["stt"],
         # Large Language Model (LLM)
-        llm=google.LLM(
-            model="gemini-2.5-flash",
-        ),
+        llm=ctx.proc.userdata["llm"],
         # Text-to-speech (TTS)
         tts=murf.TTS(
             voice="en-US-molly",
             style="Conversation",
-            tokenizer=tokenize.basic.SentenceTokenizer(min_sentence_len=2),
+            tokenizer=ctx.proc.userdata["sentence_tokenizer"],
             text_pacing=True
         ),
         # VAD and turn detection
@@ -158,6 +188,7 @@ async def entrypoint(ctx: JobContext):
         summary = usage_collector.get_summary()
         logger.info(f"Usage: {summary}")
     ctx.add_shutdown_callback(log_usage)
+    ctx.add_shutdown_callback(_wait_for_order_writes)
     # Start the session
     await session.start(
         agent=Assistant(),
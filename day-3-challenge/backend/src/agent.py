@@ -1,7 +1,9 @@
 # d:\MurfAIEvent\ten-days-of-voice-agents-2025\day-3-challenge\backend\src\test2.py
+import asyncio
 import logging
 import os
 import json
+import time
 from datetime import datetime
 
 
@@ -22,36 +24,39 @@ from livekit.agents import (
 from livekit.plugins import murf, silero, google, deepgram, noise_cancellation
 from livekit.plugins.turn_detector.multilingual import MultilingualModel
 
+import orjson
+
 logger = logging.getLogger("agent")
 load_dotenv(".env.local")
 
 WELLNESS_LOG_PATH = "wellness_log.json"
 
+_BASE_INSTRUCTIONS = (
+    "You are a supportive, grounded Health & Wellness Voice Companion.\n"
+    "Conduct a short daily check-in.\n\n"
+    "Required steps:\n"
+    "1) Ask about mood and energy.\n"
+    "2) Ask for 1–3 practical objectives for today.\n"
+    "3) Offer small, realistic, non-medical suggestions.\n"
+    "4) Recap mood and objectives and confirm.\n"
+    "5) Call the `log_checkin` tool with mood, energy, objectives.\n\n"
+    "Guidelines:\n"
+    "- Be friendly, concise, and avoid medical claims.\n"
+    "- Suggestions should be small and actionable.\n"
+    "- No complex formatting or emojis.\n"
+)
+
 def load_history() -> list:
     if os.path.exists(WELLNESS_LOG_PATH):
         try:
-            with open(WELLNESS_LOG_PATH, "r") as f:
-                return json.load(f)
+            with open(WELLNESS_LOG_PATH, "rb") as f:
+                return orjson.loads(f.read())
         except json.JSONDecodeError:
             return []
     return []
 
 def generate_system_prompt() -> str:
     history = load_history()
-    base = (
-        "You are a supportive, grounded Health & Wellness Voice Companion.\n"
-        "Conduct a short daily check-in.\n\n"
-        "Required steps:\n"
-        "1) Ask about mood and energy.\n"
-        "2) Ask for 1–3 practical objectives for today.\n"
-        "3) Offer small, realistic, non-medical suggestions.\n"
-        "4) Recap mood and objectives and confirm.\n"
-        "5) Call the `log_checkin` tool with mood, energy, objectives.\n\n"
-        "Guidelines:\n"
-        "- Be friendly, concise, and avoid medical claims.\n"
-        "- Suggestions should be small and actionable.\n"
-        "- No complex formatting or emojis.\n"
-    )
     if history:
         last = history[-1]
         prev_mood = last.get("mood")
@@ -62,38 +67,42 @@ def generate_system_prompt() -> str:
             ref = f"\nReference only one prior detail: Last energy was '{prev_energy}'. Ask how it compares today."
         else:
             ref = ""
-        return base + ref
-    return base
+        return _BASE_INSTRUCTIONS + ref
+    return _BASE_INSTRUCTIONS
+
+def _append_checkin(entry: dict) -> None:
+    entry["timestamp"] = datetime.fromtimestamp(entry["timestamp"]).isoformat()
+    data = []
+    if os.path.exists(WELLNESS_LOG_PATH):
+        with open(WELLNESS_LOG_PATH, "rb") as f:
+            try:
+                data = orjson.loads(f.read())
+            except json.JSONDecodeError:
+                data = []
+    data.append(entry)
+    with open(WELLNESS_LOG_PATH, "wb") as f:
+        f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
 
 class Assistant(Agent):
     def __init__(self, system_prompt: str) -> None:
         super().__init__(instructions=system_prompt)
 
     @llm.function_tool(description="Persist a wellness check-in entry.")
-    def log_checkin(
+    async def log_checkin(
         self,
         mood: str,
         energy: str,
         objectives: str,
     ):
         entry = {
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": time.time(),
             "mood": mood,
             "objectives": objectives,
         }
         if energy and energy.strip():
             entry["energy"] = energy
         try:
-            data = []
-            if os.path.exists(WELLNESS_LOG_PATH):
-                with open(WELLNESS_LOG_PATH, "r") as f:
-                    try:
-                        data = json.load(f)
-                    except json.JSONDecodeError:
-                        data = []
-            data.append(entry)
-            with open(WELLNESS_LOG_PATH, "w") as f:
-                json.dump(data, f, indent=2)
+            await asyncio.to_thread(_append_checkin, entry)
             return "Check-in logged."
         except Exception as e:
             logger.error(f"Failed to log check-in: {e}")
@@ -101,17 +110,20 @@ class Assistant(Agent):
 
 def prewarm(proc: JobProcess):
     proc.userdata["vad"] = silero.VAD.load()
+    proc.userdata["sentence_tokenizer"] = tokenize.basic.SentenceTokenizer(min_sentence_len=2)
+    proc.userdata["stt"] = deepgram.STT(model="nova-3")
+    proc.userdata["llm"] = google.LLM(model="gemini-2.5-flash")
 
 async def entrypoint(ctx: JobContext):
     ctx.log_context_fields = {"room": ctx.room.name}
     system_prompt = generate_system_prompt()
     session = AgentSession(
-        stt=deepgram.STT(model="nova-3"),
-        llm=google.LLM(model="gemini-2.5-flash"),
+        stt=ctx.proc.userdata["stt"],
+        llm=ctx.proc.userdata["llm"],
         tts=murf.TTS(
             voice="en-US-molly",
             style="Conversation",
-            tokenizer=tokenize.basic.SentenceTokenizer(min_sentence_len=2),
+            tokenizer=ctx.proc.userdata["sentence_tokenizer"],
             text_pacing=True,
         ),
         turn_detection=MultilingualModel(),
@@ -1,10 +1,11 @@
+import functools
 import logging
 import asyncio
-import json
 import random
+import re
+from collections.abc import Sequence
 from datetime import datetime
 from dataclasses import dataclass
-from typing import Optional
 from dotenv import load_dotenv
 from livekit.agents import (
     Agent,
@@ -18,58 +19,74 @@ from livekit.agents import (
     metrics,
     tokenize,
     function_tool,
+    get_job_context,
     RunContext,
     llm,
 )
 from livekit.plugins import murf, silero, google, deepgram, noise_cancellation
 from livekit.plugins.turn_detector.multilingual import MultilingualModel
 
+import orjson
+
 logger = logging.getLogger("agent")
 load_dotenv(".env.local")
 
-@dataclass
+CONTENT_PATH = "../shared-data/day4_tutor_content.json"
+
+_TUTOR_INSTRUCTIONS = (
+    "You are an Active Recall Coach. You operate in modes: 'learn', 'quiz', 'teach_back'. "
+    "Use the provided tools to select concept, explain summaries, ask questions, and prompt teach-back. "
+    "Be concise, friendly, and avoid complex formatting or emojis. Users may ask to switch modes at any time."
+)
+
+_ROUTER_INSTRUCTIONS = (
+    "You are the Teach-the-Tutor router. Greet the user and ask only for their preferred mode "
+    "('learn', 'quiz', 'teach_back'). Do not ask for a topic. "
+    "When the user says 'learn', call the tool 'start_tutoring' with mode='learn'. "
+    "Similarly for 'quiz' or 'teach back'. Support switching any time."
+)
+
+@dataclass(slots=True)
 class TutorState:
     mode: str = "learn"
-    concept_id: Optional[str] = None
+    concept_id: str | None = None
     mastery: dict[str, int] = None
 
     def __post_init__(self):
         if self.mastery is None:
             self.mastery = {}
 
+@functools.lru_cache(maxsize=1)
 def _load_content() -> list[dict]:
     try:
-        with open("../shared-data/day4_tutor_content.json", "r") as f:
-            return json.load(f)
+        with open(CONTENT_PATH, "rb") as f:
+            return orjson.loads(f.read())
     except Exception:
         return []
 
-def _content() -> dict[str, dict]:
-    return {entry["id"]: entry for entry in _load_content() if "id" in entry}
+_CONTENT_BY_ID: dict[str, dict] = {entry["id"]: entry for entry in _load_content() if "id" in entry}
+_CONCEPT_IDS: tuple[str, ...] = tuple(_CONTENT_BY_ID)
+_TITLE_LOWER_TO_ID: dict[str, str] = {
+    str(entry.get("title", "")).strip().lower(): cid for cid, entry in _CONTENT_BY_ID.items()
+}
 
 def _concept_or_default(concept_id: str | None) -> dict:
-    content = _content()
-    if concept_id and concept_id in content:
-        return content[concept_id]
-    return next(iter(content.values()), {
+    if concept_id and concept_id in _CONTENT_BY_ID:
+        return _CONTENT_BY_ID[concept_id]
+    return next(iter(_CONTENT_BY_ID.values()), {
         "id": "variables",
         "title": "Variables",
         "summary": "Variables store values so you can reuse them later.",
         "sample_question": "What is a variable and why is it useful?",
     })
 
-def _match_concept_id(query: str | None) -> Optional[str]:
+def _match_concept_id(query: str | None) -> str | None:
     if not query:
         return None
     q = query.strip().lower()
-    content = _content()
-    if q in content:
+    if q in _CONTENT_BY_ID:
         return q
-    for cid, c in content.items():
-        title = str(c.get("title", "")).strip().lower()
-        if title == q:
-            return cid
-    return None
+    return _TITLE_LOWER_TO_ID.get(q)
 
 def _ensure_concept(state: TutorState) -> dict:
     cid = state.concept_id
@@ -80,73 +97,79 @@ def _ensure_concept(state: TutorState) -> dict:
     state.concept_id = "variables"
     return _concept_or_default(state.concept_id)
 
-def _random_concept_id(exclude: Optional[str] = None) -> str:
-    keys = list(_content().keys())
-    if not keys:
+def _random_concept_id(exclude: str | None = None) -> str:
+    if not _CONCEPT_IDS:
         return "variables"
-    if exclude in keys and len(keys) > 1:
-        keys = [k for k in keys if k != exclude]
-    return random.choice(keys)
+    if len(_CONCEPT_IDS) == 1 or exclude not in _CONTENT_BY_ID:
+        return random.choice(_CONCEPT_IDS)
+    # Resample instead of building a filtered list; at most two draws on average.
+    while True:
+        cid = random.choice(_CONCEPT_IDS)
+        if cid != exclude:
+            return cid
 
-def _quiz_options(concept_id: str | None) -> list[str]:
+# Used when a concept in the content file has no options of its own.
+_FALLBACK_QUIZ_OPTIONS: tuple[str, ...] = (
+    "Option A A named storage for a value",
+    "Option B A function that prints text",
+    "Option C A loop that repeats steps",
+)
+
+_DEFAULT_QUIZ_OPTIONS: dict[str, tuple[str, ...]] = {
+    "variables": _FALLBACK_QUIZ_OPTIONS,
+    "loops": (
+        "Option A A way to repeat actions",
+        "Option B A single-use constant",
+        "Option C A comment for documentation",
+    ),
+}
+
+def _quiz_options(concept_id: str | None) -> Sequence[str]:
     concept = _concept_or_default(concept_id)
     opts = concept.get("options")
     if isinstance(opts, list) and len(opts) > 0:
         return opts
-    cid = concept.get("id", "variables")
-    if cid == "variables":
-        return [
-            "Option A A named storage for a value",
-            "Option B A function that prints text",
-            "Option C A loop that repeats steps",
-        ]
-    if cid == "loops":
-        return [
-            "Option A A way to repeat actions",
-            "Option B A single-use constant",
-            "Option C A comment for documentation",
-        ]
-    return [
-        "Option A A named storage for a value",
-        "Option B A function that prints text",
-        "Option C A loop that repeats steps",
-    ]
+    return _DEFAULT_QUIZ_OPTIONS.get(concept.get("id", "variables"), _FALLBACK_QUIZ_OPTIONS)
+
+# Matches "A) text" or "Option A text" (case-insensitive) on a stripped option.
+_OPTION_RE = re.compile(r"(?:(\S)\)|option \s*(\S))(.*)", re.IGNORECASE | re.DOTALL)
 
+@functools.lru_cache(maxsize=256)
 def _option_label_text(opt: str) -> tuple[str, str]:
     s = opt.strip()
-    if len(s) >= 2 and s[1] == ')':
-        label = s[0]
-        text = s[2:].lstrip(') ').strip()
-        return label, text
-    if s.lower().startswith("option "):
-        rest = s[7:].strip()
-        if rest:
-            return rest[0], rest[1:].strip()
-    return "", s
-
-async def _speak_options(sess, opts: list[str]) -> None:
-    for opt in opts:
-        label, text = _option_label_text(opt)
-        if label:
-            if text:
-                sess.say(f"Option {label}: {text}")
-            else:
-                sess.say(f"Option {label}")
-        else:
-            sess.say(opt)
+    m = _OPTION_RE.fullmatch(s)
+    if not m:
+        return "", s
+    if m.group(1):
+        return m.group(1), m.group(3).lstrip(') ').strip()
+    return m.group(2), m.group(3).strip()
+
+def _option_phrase(opt: str) -> str:
+    label, text = _option_label_text(opt)
+    if label:
+        return f"Option {label}: {text}" if text else f"Option {label}"
+    return opt
+
+async def _speak_options(sess, opts: Sequence[str]) -> None:
+    # One say() keeps all options in a single TTS request; the sentence
+    # tokenizer still paces them one option at a time.
+    sess.say(". ".join(_option_phrase(opt) for opt in opts))
+
+def _sentence_tokenizer() -> tokenize.SentenceTokenizer:
+    # Reuse the tokenizer built in prewarm; eval sessions run outside a job.
+    try:
+        return get_job_context().proc.userdata["sentence_tokenizer"]
+    except (RuntimeError, KeyError):
+        return tokenize.basic.SentenceTokenizer(min_sentence_len=2)
 
 class BaseTutorAgent(Agent):
     def __init__(self, *, voice: str, mode_label: str, chat_ctx: llm.ChatContext | None = None) -> None:
         super().__init__(
-            instructions=(
-                "You are an Active Recall Coach. You operate in modes: 'learn', 'quiz', 'teach_back'. "
-                "Use the provided tools to select concept, explain summaries, ask questions, and prompt teach-back. "
-                "Be concise, friendly, and avoid complex formatting or emojis. Users may ask to switch modes at any time."
-            ),
+            instructions=_TUTOR_INSTRUCTIONS,
             tts=murf.TTS(
                 voice=voice,
                 style="Conversation",
-                tokenizer=tokenize.basic.SentenceTokenizer(min_sentence_len=2),
+                tokenizer=_sentence_tokenizer(),
                 text_pacing=True,
             ),
             chat_ctx=chat_ctx,
@@ -242,17 +265,20 @@ class TeachBackAgent(BaseTutorAgent):
 
 def prewarm(proc: JobProcess):
     proc.userdata["vad"] = silero.VAD.load()
+    proc.userdata["sentence_tokenizer"] = tokenize.basic.SentenceTokenizer(min_sentence_len=2)
+    proc.userdata["stt"] = deepgram.STT(model="nova-3")
+    proc.userdata["llm"] = google.LLM(model="gemini-2.5-flash")
 
 async def entrypoint(ctx: JobContext):
     ctx.log_context_fields = {"room": ctx.room.name}
     tutor_state = TutorState()
     session = AgentSession[TutorState](
-        stt=deepgram.STT(model="nova-3"),
-        llm=google.LLM(model="gemini-2.5-flash"),
+        stt=ctx.proc.userdata["stt"],
+        llm=ctx.proc.userdata["llm"],
         tts=murf.TTS(
             voice="en-US-matthew",
             style="Conversation",
-            tokenizer=tokenize.basic.SentenceTokenizer(min_sentence_len=2),
+            tokenizer=ctx.proc.userdata["sentence_tokenizer"],
             text_pacing=True,
         ),
         turn_detection=MultilingualModel(),
@@ -279,16 +305,10 @@ async def entrypoint(ctx: JobContext):
 
 class RouterAgent(Agent):
     def __init__(self) -> None:
-        instructions = (
-            "You are the Teach-the-Tutor router. Greet the user and ask only for their preferred mode "
-            "('learn', 'quiz', 'teach_back'). Do not ask for a topic. "
-            "When the user says 'learn', call the tool 'start_tutoring' with mode='learn'. "
-            "Similarly for 'quiz' or 'teach back'. Support switching any time."
-        )
-        super().__init__(instructions=instructions)
+        super().__init__(instructions=_ROUTER_INSTRUCTIONS)
 
     @function_tool
-    async def start_tutoring(self, context: RunContext[TutorState], mode: str, concept_id: Optional[str] = None) -> Agent:
+    async def start_tutoring(self, context: RunContext[TutorState], mode: str, concept_id: str | None = None) -> Agent:
         matched = _match_concept_id(concept_id)
         if mode == "learn":
             context.userdata.concept_id = matched if matched is not None else "variables"
@@ -1,9 +1,13 @@
+import asyncio
+import functools
 import logging
 import os
-import json
+import re
+import threading
+import time
+from collections import Counter
 from datetime import datetime
 from dataclasses import dataclass
-from typing import Optional
 from dotenv import load_dotenv
 from livekit.agents import (
     Agent,
@@ -22,80 +26,146 @@ from livekit.agents import (
 from livekit.plugins import murf, silero, google, deepgram, noise_cancellation
 from livekit.plugins.turn_detector.multilingual import MultilingualModel
 
+import orjson
+
 logger = logging.getLogger("agent")
 load_dotenv(".env.local")
 
 FAQ_PATH = "../shared-data/yellowai_faq.json"
 LEADS_PATH = "../shared-data/leads.json"
 
-def _load_faq() -> list[dict]:
+# Seconds to wait after a lead field change before writing, so a burst of
+# record_lead_field calls becomes a single write.
+LEADS_FLUSH_DELAY = 2.0
+
+# Serializes read-modify-write cycles on the leads file across worker threads.
+_LEADS_LOCK = threading.Lock()
+# Lead records changed since the last flush, keyed by lead id.
+_PENDING_LEADS: dict[str, dict] = {}
+_flush_task: asyncio.Task | None = None
+
+_TOKEN_RE = re.compile(r"\w+")
+
+# Field weights used when scoring a query token against a FAQ entry.
+_QUESTION_WEIGHT = 2
+_ANSWER_WEIGHT = 1
+_TAG_WEIGHT = 3
+
+@functools.lru_cache(maxsize=1)
+def _load_faq_index(
+    mtime: float,
+) -> tuple[list[dict], dict[str, list[tuple[int, int]]], dict[str, list[int]]]:
+    # mtime is only part of the cache key, so editing the FAQ file triggers a reload.
     try:
-        with open(FAQ_PATH, "r", encoding="utf-8") as f:
-            return json.load(f)
+        with open(FAQ_PATH, "rb") as f:
+            entries = orjson.loads(f.read())
     except Exception:
-        return []
+        return [], {}, {}
+    # Question/answer words -> (entry, weight), and whole tags -> entries.
+    words: dict[str, list[tuple[int, int]]] = {}
+    tags: dict[str, list[int]] = {}
+    for i, entry in enumerate(entries):
+        for field, weight in (("question", _QUESTION_WEIGHT), ("answer", _ANSWER_WEIGHT)):
+            for word in set(_TOKEN_RE.findall(str(entry.get(field, "")).lower())):
+                words.setdefault(word, []).append((i, weight))
+        for tag in {str(t).lower() for t in entry.get("tags", [])}:
+            tags.setdefault(tag, []).append(i)
+    return entries, words, tags
+
+@functools.lru_cache(maxsize=512)
+def _search_faq_tokens(mtime: float, tokens: tuple[str, ...]) -> dict | None:
+    entries, words, tags = _load_faq_index(mtime)
+    scores: Counter[int] = Counter()
+    plural_tag_hits: Counter[int] = Counter()
+    for token in tokens:
+        # A token matches any question/answer word containing it ("port" -> "supported"),
+        # but scores at most once per field of an entry.
+        hits: set[tuple[int, int]] = set()
+        for word, postings in words.items():
+            if token in word:
+                hits.update(postings)
+        for i, weight in hits:
+            scores[i] += weight
+        for i in tags.get(token, ()):
+            scores[i] += _TAG_WEIGHT
+        # Plural tags never score, they only break ties ("integration" -> "integrations").
+        for i in tags.get(token + "s", ()):
+            plural_tag_hits[i] += 1
+    if not scores:
+        return None
+    # Remaining ties go to the entry listed first in the FAQ file.
+    best = max(scores, key=lambda i: (scores[i], plural_tag_hits[i], -i))
+    return entries[best]
 
-def _search_faq(query: str) -> Optional[dict]:
-    q = query.lower().strip()
-    best = None
-    best_score = 0
-    for entry in _load_faq():
-        score = 0
-        question = str(entry.get("question", "")).lower()
-        answer = str(entry.get("answer", "")).lower()
-        tags = [str(t).lower() for t in entry.get("tags", [])]
-        for token in q.split():
-            if token in question:
-                score += 2
-            if token in answer:
-                score += 1
-            if token in tags:
-                score += 3
-        if score > best_score:
-            best = entry
-            best_score = score
-    return best
+def _search_faq(query: str) -> dict | None:
+    try:
+        mtime = os.stat(FAQ_PATH).st_mtime
+    except OSError:
+        return None
+    # Sorting the tokens lets rephrasings with the same words share a cache entry.
+    tokens = tuple(sorted(_TOKEN_RE.findall(query.lower())))
+    return _search_faq_tokens(mtime, tokens)
 
 def _load_leads() -> list:
     try:
         if os.path.exists(LEADS_PATH):
-            with open(LEADS_PATH, "r", encoding="utf-8") as f:
-                return json.load(f)
+            with open(LEADS_PATH, "rb") as f:
+                return orjson.loads(f.read())
     except Exception:
         return []
     return []
 
+def _write_leads() -> None:
+    with _LEADS_LOCK:
+        if not _PENDING_LEADS:
+            return
+        leads = _load_leads()
+        index_by_id = {r.get("id"): i for i, r in enumerate(leads)}
+        # Drain under the lock so a concurrent flush can never write an older record last.
+        while _PENDING_LEADS:
+            lead_id, record = _PENDING_LEADS.popitem()
+            # Records carry a raw time.time() until they are written.
+            record["updated_at"] = datetime.fromtimestamp(record["updated_at"]).isoformat()
+            existing_index = index_by_id.get(lead_id)
+            if existing_index is None:
+                index_by_id[lead_id] = len(leads)
+                leads.append(record)
+            else:
+                leads[existing_index] = record
+        try:
+            with open(LEADS_PATH, "wb") as f:
+                f.write(orjson.dumps(leads, option=orjson.OPT_INDENT_2))
+        except Exception as e:
+            logger.error(f"Failed to write leads: {e}")
+
+async def _flush_leads() -> None:
+    if _PENDING_LEADS:
+        await asyncio.to_thread(_write_leads)
+
+async def _flush_leads_later() -> None:
+    await asyncio.sleep(LEADS_FLUSH_DELAY)
+    await _flush_leads()
+
 def _upsert_lead(record: dict) -> None:
-    leads = _load_leads()
-    existing_index = None
-    for i, r in enumerate(leads):
-        if r.get("id") == record.get("id"):
-            existing_index = i
-            break
-    if existing_index is None:
-        leads.append(record)
-    else:
-        leads[existing_index] = record
-    try:
-        with open(LEADS_PATH, "w", encoding="utf-8") as f:
-            json.dump(leads, f, indent=2)
-    except Exception as e:
-        logger.error(f"Failed to write leads: {e}")
+    global _flush_task
+    _PENDING_LEADS[record["id"]] = record
+    if _flush_task is None or _flush_task.done():
+        _flush_task = asyncio.create_task(_flush_leads_later())
 
-@dataclass
+@dataclass(slots=True)
 class LeadState:
     id: str = ""
-    name: Optional[str] = None
-    company: Optional[str] = None
-    email: Optional[str] = None
-    role: Optional[str] = None
-    use_case: Optional[str] = None
-    team_size: Optional[str] = None
-    timeline: Optional[str] = None
+    name: str | None = None
+    company: str | None = None
+    email: str | None = None
+    role: str | None = None
+    use_case: str | None = None
+    team_size: str | None = None
+    timeline: str | None = None
 
     def ensure_id(self):
         if not self.id:
-            self.id = datetime.now().strftime("%Y%m%d%H%M%S%f")
+            self.id = f"{time.time_ns():x}"
 
     def to_record(self, status: str = "in_progress") -> dict:
         return {
@@ -108,24 +178,24 @@ class LeadState:
             "team_size": self.team_size,
             "timeline": self.timeline,
             "status": status,
-            "updated_at": datetime.now().isoformat(),
+            "updated_at": time.time(),
         }
 
+_INSTRUCTIONS = (
+    "You are Yellow AI's friendly Sales Development Representative. "
+    "Greet visitors warmly, ask what brought them here and what they're working on, "
+    "and keep the conversation focused on understanding their needs. "
+    "When asked about product, company, channels, integrations, or pricing, call the `answer_faq` tool with the user's question and answer only from the provided FAQ. "
+    "If information is not in the FAQ, say you don't have that detail and offer to connect sales. "
+    "Collect lead details naturally: name, company, email, role, use case, team size, and timeline. "
+    "Whenever the user provides a field, call `record_lead_field` with the field and value. "
+    "When the user indicates the conversation is done (phrases like 'that's all', 'I'm done', 'thanks'), call `complete_lead` to summarize and finalize. "
+    "Be concise, helpful, and refuse harmful or inappropriate requests. Do not claim to know personal information about the user."
+)
+
 class Assistant(Agent):
     def __init__(self) -> None:
-        super().__init__(
-            instructions=(
-                "You are Yellow AI's friendly Sales Development Representative. "
-                "Greet visitors warmly, ask what brought them here and what they're working on, "
-                "and keep the conversation focused on understanding their needs. "
-                "When asked about product, company, channels, integrations, or pricing, call the `answer_faq` tool with the user's question and answer only from the provided FAQ. "
-                "If information is not in the FAQ, say you don't have that detail and offer to connect sales. "
-                "Collect lead details naturally: name, company, email, role, use case, team size, and timeline. "
-                "Whenever the user provides a field, call `record_lead_field` with the field and value. "
-                "When the user indicates the conversation is done (phrases like 'that's all', 'I'm done', 'thanks'), call `complete_lead` to summarize and finalize. "
-                "Be concise, helpful, and refuse harmful or inappropriate requests. Do not claim to know personal information about the user."
-            )
-        )
+        super().__init__(instructions=_INSTRUCTIONS)
 
     @function_tool
     async def answer_faq(self, context: RunContext[LeadState], query: str) -> str:
@@ -163,6 +233,7 @@ class Assistant(Agent):
         context.userdata.ensure_id()
         rec = context.userdata.to_record(status="completed")
         _upsert_lead(rec)
+        await _flush_leads()
         name = context.userdata.name or "a prospective customer"
         company = context.userdata.company or "their company"
         use_case = context.userdata.use_case or "a potential use case"
@@ -171,17 +242,20 @@ class Assistant(Agent):
 
 def prewarm(proc: JobProcess):
     proc.userdata["vad"] = silero.VAD.load()
+    proc.userdata["sentence_tokenizer"] = tokenize.basic.SentenceTokenizer(min_sentence_len=2)
+    proc.userdata["stt"] = deepgram.STT(model="nova-3")
+    proc.userdata["llm"] = google.LLM(model="gemini-2.5-flash")
 
 async def entrypoint(ctx: JobContext):
     ctx.log_context_fields = {"room": ctx.room.name}
     lead_state = LeadState()
     session = AgentSession[LeadState](
-        stt=deepgram.STT(model="nova-3"),
-        llm=google.LLM(model="gemini-2.5-flash"),
+        stt=ctx.proc.userdata["stt"],
+        llm=ctx.proc.userdata["llm"],
         tts=murf.TTS(
             voice="en-US-matthew",
             style="Conversation",
-            tokenizer=tokenize.basic.SentenceTokenizer(min_sentence_len=2),
+            tokenizer=ctx.proc.userdata["sentence_tokenizer"],
             text_pacing=True,
         ),
         turn_detection=MultilingualModel(),
@@ -198,6 +272,7 @@ async def entrypoint(ctx: JobContext):
         summary = usage_collector.get_summary()
         logger.info(f"Usage: {summary}")
     ctx.add_shutdown_callback(log_usage)
+    ctx.add_shutdown_callback(_flush_leads)
     await session.start(
         agent=Assistant(),
         room=ctx.room,
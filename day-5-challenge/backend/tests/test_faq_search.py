@@ -0,0 +1,39 @@
+from pathlib import Path
+
+import pytest
+
+import agent
+
+FAQ_PATH = Path(__file__).resolve().parents[2] / "shared-data" / "yellowai_faq.json"
+
+
+@pytest.fixture(autouse=True)
+def _shipped_faq(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(agent, "FAQ_PATH", str(FAQ_PATH))
+
+
+@pytest.mark.parametrize(
+    ("query", "expected_id"),
+    [
+        ("whatsapp support", "channels"),
+        ("integration", "integrations"),
+        ("what channels are supported", "channels"),
+        ("do you have a free tier", "pricing"),
+        ("who is yellow ai for", "audience"),
+        ("help desk", "integrations"),
+        # Same answers as the original substring scorer.
+        ("I want to know pricing for my team", "pricing"),
+        ("tell me about pricing", "about"),
+        ("who uses it", "integrations"),
+        ("it", "integrations"),
+        ("port", "channels"),
+    ],
+)
+def test_search_faq_ranking(query: str, expected_id: str) -> None:
+    entry = agent._search_faq(query)
+    assert entry is not None
+    assert entry["id"] == expected_id
+
+
+def test_search_faq_no_match() -> None:
+    assert agent._search_faq("xyzzy") is None
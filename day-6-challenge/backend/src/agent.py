@@ -1,6 +1,12 @@
+import asyncio
+import atexit
 import logging
 import os
+import re
 import sqlite3
+import threading
+import time
+from collections import OrderedDict
 from dataclasses import dataclass
 from typing import Optional
 
@@ -27,49 +33,104 @@ load_dotenv(".env.local")
 
 DB_PATH = os.path.join(os.path.dirname(__file__), "fraud_cases.db")
 
+_SELECT_CASE_SQL = (
+    "SELECT id, customer_name, security_id, masked_card, amount, merchant, location, timestamp, "
+    "security_question, security_answer, status, outcome_note "
+    "FROM fraud_cases WHERE username = ? ORDER BY id DESC LIMIT 1"
+)
+_UPDATE_STATUS_SQL = "UPDATE fraud_cases SET status = ?, outcome_note = ? WHERE id = ?"
+
+# One connection is shared by every tool call in the process; hold _DB_LOCK while using it.
+_DB_LOCK = threading.Lock()
+_conn: Optional[sqlite3.Connection] = None
+
 def _db_connect() -> sqlite3.Connection:
-    return sqlite3.connect(DB_PATH)
+    global _conn
+    if _conn is None:
+        conn = sqlite3.connect(DB_PATH, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA cache_size=-64000")
+        conn.row_factory = sqlite3.Row
+        # Lets _SELECT_CASE_SQL probe the newest case per username instead of scanning the table.
+        try:
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_fraud_username_id ON fraud_cases(username, id DESC)")
+            conn.execute("PRAGMA optimize")
+        except sqlite3.OperationalError as e:
+            logger.warning(f"Skipping fraud_cases index: {e}")
+        atexit.register(conn.close)
+        _conn = conn
+    return _conn
+
+# Recently loaded cases by username, so repeated load_fraud_case calls skip SQLite.
+_CASE_CACHE_TTL = 30.0
+_CASE_CACHE_MAXSIZE = 256
+_CASE_CACHE_LOCK = threading.Lock()
+_case_cache: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+# case id -> username, used to drop the cached case when its status changes.
+_case_owner: dict[int, str] = {}
+
+_NON_DIGIT_RE = re.compile(r"\D")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+def _normalize_answer(value: Optional[str]) -> str:
+    return _WHITESPACE_RE.sub(" ", str(value or "").strip().lower())
+
+def _fetch_case(username: str) -> Optional[dict]:
+    with _DB_LOCK:
+        row = _db_connect().execute(_SELECT_CASE_SQL, (username,)).fetchone()
+    if not row:
+        return None
+    case = dict(row)
+    # The masked card never changes for a case, so derive the spoken last four digits once.
+    case["last4"] = _NON_DIGIT_RE.sub("", str(case.get("masked_card", "")))[-4:]
+    case["security_answer_norm"] = _normalize_answer(case.get("security_answer"))
+    return case
 
 def _load_case(username: str) -> Optional[dict]:
-    conn = _db_connect()
-    try:
-        cur = conn.cursor()
-        cur.execute(
-            "SELECT id, customer_name, security_id, masked_card, amount, merchant, location, timestamp, security_question, security_answer, status, outcome_note FROM fraud_cases WHERE username = ? ORDER BY id DESC LIMIT 1",
-            (username,),
-        )
-        row = cur.fetchone()
-        if not row:
-            return None
-        return {
-            "id": row[0],
-            "customer_name": row[1],
-            "security_id": row[2],
-            "masked_card": row[3],
-            "amount": row[4],
-            "merchant": row[5],
-            "location": row[6],
-            "timestamp": row[7],
-            "security_question": row[8],
-            "security_answer": row[9],
-            "status": row[10],
-            "outcome_note": row[11],
-        }
-    finally:
-        conn.close()
+    now = time.monotonic()
+    with _CASE_CACHE_LOCK:
+        hit = _case_cache.get(username)
+        if hit and hit[0] > now:
+            _case_cache.move_to_end(username)
+            return hit[1]
+    case = _fetch_case(username)
+    if case:
+        with _CASE_CACHE_LOCK:
+            _case_cache[username] = (now + _CASE_CACHE_TTL, case)
+            _case_cache.move_to_end(username)
+            _case_owner[case["id"]] = username
+            while len(_case_cache) > _CASE_CACHE_MAXSIZE:
+                _, (_, evicted) = _case_cache.popitem(last=False)
+                _case_owner.pop(evicted["id"], None)
+    return case
 
-def _update_status(case_id: int, status: str, note: str) -> None:
-    conn = _db_connect()
-    try:
-        cur = conn.cursor()
-        cur.execute(
-            "UPDATE fraud_cases SET status = ?, outcome_note = ? WHERE id = ?",
-            (status, note, case_id),
-        )
-        conn.commit()
+def _invalidate_case(case_id: int) -> None:
+    with _CASE_CACHE_LOCK:
+        username = _case_owner.pop(case_id, None)
+        if username is not None:
+            _case_cache.pop(username, None)
+
+def _update_statuses(updates: list[tuple[int, str, str]]) -> None:
+    """Apply (case_id, status, note) updates in one write transaction."""
+    rows = [(status, note, case_id) for case_id, status, note in updates]
+    with _DB_LOCK:
+        conn = _db_connect()
+        # IMMEDIATE takes the write lock up front instead of upgrading mid-transaction.
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(_UPDATE_STATUS_SQL, rows)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+    for case_id, status, note in updates:
+        _invalidate_case(case_id)
         logger.info(f"Fraud case {case_id} updated: {status} - {note}")
-    finally:
-        conn.close()
+
+def _update_status(case_id: int, status: str, note: str) -> None:
+    _update_statuses([(case_id, status, note)])
 
 @dataclass
 class FraudCaseState:
@@ -78,19 +139,19 @@ class FraudCaseState:
     verified: bool = False
     final_status: Optional[str] = None
 
+_INSTRUCTIONS = (
+    "You are a calm, professional fraud detection representative named Alex for Easy Bank. "
+    "At the start of the call, clearly introduce Easy Bank and yourself, explain you are contacting the user about a suspicious card transaction, and ask for their username to locate the case. "
+    "After the user provides a username, call the `load_fraud_case` tool with it. If no case is found, politely explain and ask for a different username or end the call. "
+    "Use only non-sensitive verification. Call `get_security_question` to retrieve the security question from the loaded case and ask it verbatim. Do not ask for full card numbers, PINs, passwords, or credentials. When the user answers, call `verify_answer` with the user's answer. If verification fails, apologize, say you cannot proceed, call `finalize_verification_failed`, and end the call. "
+    "If verification passes, use only database values to describe the transaction by calling `read_transaction_details`: include merchant, location, timestamp, amount, and only the masked card's last four digits. Then ask if they made this transaction (yes or no). Based on the answer, call `finalize_case` with true for yes or false for no. "
+    "When finalizing, the status must be one of confirmed_safe or confirmed_fraud, with a concise outcome note. End the call by confirming the action taken. "
+    "Be concise, reassuring, and refuse harmful or inappropriate requests. Do not claim to know personal information about the user beyond what is in the case data."
+)
+
 class Assistant(Agent):
     def __init__(self) -> None:
-        super().__init__(
-            instructions=(
-                "You are a calm, professional fraud detection representative named Alex for Easy Bank. "
-                "At the start of the call, clearly introduce Easy Bank and yourself, explain you are contacting the user about a suspicious card transaction, and ask for their username to locate the case. "
-                "After the user provides a username, call the `load_fraud_case` tool with it. If no case is found, politely explain and ask for a different username or end the call. "
-                "Use only non-sensitive verification. Call `get_security_question` to retrieve the security question from the loaded case and ask it verbatim. Do not ask for full card numbers, PINs, passwords, or credentials. When the user answers, call `verify_answer` with the user's answer. If verification fails, apologize, say you cannot proceed, call `finalize_verification_failed`, and end the call. "
-                "If verification passes, use only database values to describe the transaction by calling `read_transaction_details`: include merchant, location, timestamp, amount, and only the masked card's last four digits. Then ask if they made this transaction (yes or no). Based on the answer, call `finalize_case` with true for yes or false for no. "
-                "When finalizing, the status must be one of confirmed_safe or confirmed_fraud, with a concise outcome note. End the call by confirming the action taken. "
-                "Be concise, reassuring, and refuse harmful or inappropriate requests. Do not claim to know personal information about the user beyond what is in the case data."
-            )
-        )
+        super().__init__(instructions=_INSTRUCTIONS)
 
     @function_tool
     async def get_security_question(self, context: RunContext[FraudCaseState]) -> str:
@@ -104,7 +165,7 @@ class Assistant(Agent):
     @function_tool
     async def load_fraud_case(self, context: RunContext[FraudCaseState], username: str) -> str:
         context.userdata.username = username.strip()
-        case = _load_case(context.userdata.username)
+        case = await asyncio.to_thread(_load_case, context.userdata.username)
         context.userdata.case = case
         if not case:
             return "No fraud case found for that username."
@@ -114,9 +175,8 @@ class Assistant(Agent):
     async def verify_answer(self, context: RunContext[FraudCaseState], answer: str) -> str:
         if not context.userdata.case:
             return "No case loaded."
-        provided = (answer or "").strip().lower()
-        expected = str(context.userdata.case.get("security_answer", "")).strip().lower()
-        ok = provided == expected and expected != ""
+        expected = context.userdata.case["security_answer_norm"]
+        ok = expected != "" and _normalize_answer(answer) == expected
         context.userdata.verified = ok
         if ok:
             return "Verification passed. Read transaction details and ask if it was made."
@@ -127,9 +187,7 @@ class Assistant(Agent):
         if not context.userdata.case:
             return "No case loaded."
         c = context.userdata.case
-        digits = "".join(d for d in str(c.get("masked_card", "")) if d.isdigit())
-        last4 = digits[-4:] if digits else ""
-        return f"Suspicious transaction: {c['merchant']} at {c['location']} around {c['timestamp']} for ${c['amount']:.2f} on card ending {last4}."
+        return f"Suspicious transaction: {c['merchant']} at {c['location']} around {c['timestamp']} for ${c['amount']:.2f} on card ending {c['last4']}."
 
     @function_tool
     async def finalize_case(self, context: RunContext[FraudCaseState], is_legit: bool) -> str:
@@ -142,7 +200,7 @@ class Assistant(Agent):
         else:
             status = "confirmed_fraud"
             note = "Customer denied transaction; card blocked and dispute initiated."
-        _update_status(case_id, status, note)
+        await asyncio.to_thread(_update_status, case_id, status, note)
         context.userdata.final_status = status
         return f"Status updated: {status}."
 
@@ -153,25 +211,32 @@ class Assistant(Agent):
         case_id = int(context.userdata.case["id"])
         status = "verification_failed"
         note = "Verification failed; unable to proceed."
-        _update_status(case_id, status, note)
+        await asyncio.to_thread(_update_status, case_id, status, note)
         context.userdata.final_status = status
         return f"Status updated: {status}."
 
 def prewarm(proc: JobProcess):
     proc.userdata["vad"] = silero.VAD.load()
+    # Connecting would create an empty database file, so only warm up an existing one.
+    if os.path.exists(DB_PATH):
+        with _DB_LOCK:
+            _db_connect()
+    proc.userdata["stt"] = deepgram.STT(model="nova-3")
+    proc.userdata["llm"] = google.LLM(model="gemini-2.5-flash")
+    proc.userdata["tts"] = murf.TTS(
+        voice="en-IN-Isha",
+        style="Conversation",
+        tokenizer=tokenize.basic.SentenceTokenizer(min_sentence_len=2),
+        text_pacing=True,
+    )
 
 async def entrypoint(ctx: JobContext):
     ctx.log_context_fields = {"room": ctx.room.name}
     state = FraudCaseState()
     session = AgentSession[FraudCaseState](
-        stt=deepgram.STT(model="nova-3"),
-        llm=google.LLM(model="gemini-2.5-flash"),
-        tts=murf.TTS(
-            voice="en-IN-Isha",
-            style="Conversation",
-            tokenizer=tokenize.basic.SentenceTokenizer(min_sentence_len=2),
-            text_pacing=True,
-        ),
+        stt=ctx.proc.userdata["stt"],
+        llm=ctx.proc.userdata["llm"],
+        tts=ctx.proc.userdata["tts"],
         turn_detection=MultilingualModel(),
         vad=ctx.proc.userdata["vad"],
         preemptive_generation=True,
@@ -1,6 +1,7 @@
+import asyncio
+import itertools
 import logging
 import os
-import json
 from dataclasses import dataclass, field
 from typing import Optional, List, Dict
 
@@ -22,6 +23,8 @@ from livekit.agents import (
 from livekit.plugins import deepgram, google, murf, noise_cancellation, silero
 from livekit.plugins.turn_detector.multilingual import MultilingualModel
 
+import orjson
+
 logger = logging.getLogger("agent")
 load_dotenv(".env.local")
 
@@ -39,177 +42,201 @@ class CartItem:
 @dataclass
 class OrderState:
     catalog: List[Dict] = field(default_factory=list)
-    cart: List[CartItem] = field(default_factory=list)
+    # Lookup tables over `catalog`, built once by _index_catalog.
+    catalog_index: dict[str, dict] = field(default_factory=dict)
+    category_index: dict[str, list[dict]] = field(default_factory=dict)
+    tag_index: dict[str, list[dict]] = field(default_factory=dict)
+    # Keyed by (lowercase name, notes or "") so repeat adds merge into one line.
+    cart: dict[tuple[str, str], CartItem] = field(default_factory=dict)
+    cart_total: float = 0.0
     customer_name: Optional[str] = None
     customer_address: Optional[str] = None
 
+    def add_to_cart(self, item: dict, quantity: int, notes: Optional[str] = None) -> CartItem:
+        key = (item["_name_l"], notes or "")
+        ci = self.cart.get(key)
+        if ci is None:
+            ci = CartItem(
+                name=item["name"],
+                price=float(item["price"]),
+                quantity=0,
+                notes=notes,
+                category=item.get("category"),
+            )
+            self.cart[key] = ci
+        ci.quantity += quantity
+        self.cart_total += ci.price * quantity
+        return ci
+
+    def remove_from_cart(self, item_name: str) -> bool:
+        q = item_name.strip().lower()
+        keys = [k for k in self.cart if k[0] == q]
+        for k in keys:
+            ci = self.cart.pop(k)
+            self.cart_total -= ci.price * ci.quantity
+        if not self.cart:
+            self.cart_total = 0.0
+        return bool(keys)
+
+    def set_quantity(self, item_name: str, quantity: int) -> Optional[CartItem]:
+        q = item_name.strip().lower()
+        for (name, _), ci in self.cart.items():
+            if name == q:
+                self.cart_total += ci.price * (quantity - ci.quantity)
+                ci.quantity = quantity
+                return ci
+        return None
+
 def _load_catalog() -> List[Dict]:
     if not os.path.exists(CATALOG_PATH):
         return []
-    with open(CATALOG_PATH, "r", encoding="utf-8") as f:
-        return json.load(f)
+    with open(CATALOG_PATH, "rb") as f:
+        catalog = orjson.loads(f.read())
+    # Normalized copies of the matchable fields so lookups never lowercase per call.
+    for it in catalog:
+        it["_name_l"] = str(it.get("name", "")).strip().lower()
+        it["_category_l"] = str(it.get("category", "")).lower()
+        it["_tags_l"] = frozenset(str(x).lower() for x in it.get("tags", []))
+    return catalog
+
+def _write_order(order: dict) -> None:
+    # Write to a temp file and rename so a crash never leaves a half-written order.
+    tmp_path = ORDER_PATH + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(orjson.dumps(order, option=orjson.OPT_INDENT_2))
+    os.replace(tmp_path, ORDER_PATH)
 
-def _find_item(catalog: List[Dict], item_name: str) -> Optional[Dict]:
-    q = item_name.strip().lower()
+def _index_catalog(catalog: list[dict]) -> tuple[dict[str, dict], dict[str, list[dict]], dict[str, list[dict]]]:
+    """Return (name, category, tag) indexes; keys are lowercased, lists keep catalog order."""
+    by_name: dict[str, dict] = {}
+    by_category: dict[str, list[dict]] = {}
+    by_tag: dict[str, list[dict]] = {}
     for it in catalog:
-        if str(it.get("name", "")).strip().lower() == q:
-            return it
-    return None
+        by_name.setdefault(it["_name_l"], it)
+        by_category.setdefault(it["_category_l"], []).append(it)
+        for tag in it["_tags_l"]:
+            by_tag.setdefault(tag, []).append(it)
+    return by_name, by_category, by_tag
 
-def _cart_total(cart: List[CartItem]) -> float:
-    return sum(i.price * i.quantity for i in cart)
+def _find_item(catalog_index: dict[str, dict], item_name: str) -> Optional[dict]:
+    return catalog_index.get(item_name.strip().lower())
+
+_QTY_WORDS = (
+    "",
+    "one", "two", "three", "four", "five", "six", "seven", "eight", "nine", "ten",
+    "eleven", "twelve", "thirteen", "fourteen", "fifteen", "sixteen", "seventeen", "eighteen", "nineteen", "twenty",
+)
 
 def _qty_word(n: int) -> str:
-    words = {
-        1: "one",
-        2: "two",
-        3: "three",
-        4: "four",
-        5: "five",
-        6: "six",
-        7: "seven",
-        8: "eight",
-        9: "nine",
-        10: "ten",
-        11: "eleven",
-        12: "twelve",
-        13: "thirteen",
-        14: "fourteen",
-        15: "fifteen",
-        16: "sixteen",
-        17: "seventeen",
-        18: "eighteen",
-        19: "nineteen",
-        20: "twenty",
-    }
-    return words.get(max(1, n), str(n))
+    return _QTY_WORDS[n] if 1 <= n <= 20 else str(n)
+
+# Recipe name (lowercase) -> catalog item names added by add_recipe_items.
+_RECIPES: dict[str, tuple[str, ...]] = {
+    "masala chai": ("Tea Leaves", "Milk", "Sugar", "Cardamom Pods"),
+    "dal": ("Toor Dal", "Turmeric Powder", "Cumin Seeds", "Ghee"),
+    "paneer curry": ("Paneer", "Tomato Puree", "Onion", "Garam Masala", "Ginger Garlic Paste"),
+    "biryani": ("Basmati Rice", "Biryani Masala", "Mixed Vegetables"),
+    "roti": ("Atta (Wheat Flour)", "Ghee"),
+    "poha": ("Poha (Flattened Rice)", "Peanuts", "Mustard Seeds", "Green Chilies", "Onion"),
+}
 
 def _fmt_currency(amount: float) -> str:
     return f"₹{amount:.2f}"
 
+_INSTRUCTIONS = (
+    "You are a friendly ordering assistant for SafeBazaar. "
+    "Greet the user, explain you can help order groceries, snacks, and simple prepared foods. "
+    "Ask for clarifications when needed such as size, brand, and quantity. "
+    "Use tools to add, remove, update, and list cart items, and to add recipe ingredients. You can list catalog items by category (including Prepared Food) or by tags like vegetarian, vegan, gluten-free, or spicy. "
+    "Confirm cart changes out loud after each tool call so the user knows what happened. "
+    "When the user says they are done, call `place_order` to finalize, summarize the cart and total, and save the order. "
+    "Refuse harmful or inappropriate requests and do not claim to know private user information."
+)
+
 class Assistant(Agent):
     def __init__(self) -> None:
-        super().__init__(
-            instructions=(
-                "You are a friendly ordering assistant for SafeBazaar. "
-                "Greet the user, explain you can help order groceries, snacks, and simple prepared foods. "
-                "Ask for clarifications when needed such as size, brand, and quantity. "
-                "Use tools to add, remove, update, and list cart items, and to add recipe ingredients. You can list catalog items by category (including Prepared Food) or by tags like vegetarian, vegan, gluten-free, or spicy. "
-                "Confirm cart changes out loud after each tool call so the user knows what happened. "
-                "When the user says they are done, call `place_order` to finalize, summarize the cart and total, and save the order. "
-                "Refuse harmful or inappropriate requests and do not claim to know private user information."
-            )
-        )
+        super().__init__(instructions=_INSTRUCTIONS)
 
     @function_tool
     async def list_catalog(self, context: RunContext[OrderState], category: Optional[str] = None, tag: Optional[str] = None) -> str:
-        items = context.userdata.catalog
-        if category:
-            c = category.strip().lower()
-            items = [i for i in items if str(i.get("category", "")).lower() == c]
-        if tag:
-            t = tag.strip().lower()
-            items = [i for i in items if t in [str(x).lower() for x in i.get("tags", [])]]
-        if not items:
-            return "No items found."
-        lines = [f"{i['name']} ({_fmt_currency(float(i['price']))})" for i in items[:25]]
-        return ", ".join(lines)
+        c = category.strip().lower() if category else ""
+        t = tag.strip().lower() if tag else ""
+        by_category = context.userdata.category_index.get(c, []) if c else None
+        by_tag = context.userdata.tag_index.get(t, []) if t else None
+        if by_category is not None and by_tag is not None:
+            # one pass over the smaller bucket, checking the other key per item
+            if len(by_category) <= len(by_tag):
+                items = (i for i in by_category if t in i["_tags_l"])
+            else:
+                items = (i for i in by_tag if i["_category_l"] == c)
+        elif by_category is not None:
+            items = by_category
+        elif by_tag is not None:
+            items = by_tag
+        else:
+            items = context.userdata.catalog
+        # stop filtering as soon as 25 matches are found
+        top = itertools.islice(items, 25)
+        return ", ".join(f"{i['name']} ({_fmt_currency(float(i['price']))})" for i in top) or "No items found."
 
     @function_tool
     async def add_item(self, context: RunContext[OrderState], item_name: str, quantity: int = 1, notes: Optional[str] = None) -> str:
         if quantity <= 0:
             return "Quantity must be at least 1."
-        item = _find_item(context.userdata.catalog, item_name)
+        item = _find_item(context.userdata.catalog_index, item_name)
         if not item:
             return "Item not found in catalog."
-        for ci in context.userdata.cart:
-            if ci.name.lower() == item["name"].lower() and (ci.notes or "") == (notes or ""):
-                ci.quantity += quantity
-                total = _cart_total(context.userdata.cart)
-                return f"Updated {ci.name} to {ci.quantity}. Cart total {_fmt_currency(total)}."
-        context.userdata.cart.append(
-            CartItem(
-                name=item["name"],
-                price=float(item["price"]),
-                quantity=quantity,
-                notes=notes,
-                category=item.get("category"),
-            )
-        )
-        total = _cart_total(context.userdata.cart)
+        ci = context.userdata.add_to_cart(item, quantity, notes)
+        total = context.userdata.cart_total
+        if ci.quantity != quantity:
+            return f"Updated {ci.name} to {ci.quantity}. Cart total {_fmt_currency(total)}."
         return f"Added {item['name']} x{quantity}. Cart total {_fmt_currency(total)}."
 
     @function_tool
     async def remove_item(self, context: RunContext[OrderState], item_name: str) -> str:
-        before = len(context.userdata.cart)
-        context.userdata.cart = [c for c in context.userdata.cart if c.name.lower() != item_name.strip().lower()]
-        after = len(context.userdata.cart)
-        if before == after:
+        if not context.userdata.remove_from_cart(item_name):
             return "Item not found in cart."
-        total = _cart_total(context.userdata.cart)
+        total = context.userdata.cart_total
         return f"Removed {item_name}. Cart total {_fmt_currency(total)}."
 
     @function_tool
     async def update_quantity(self, context: RunContext[OrderState], item_name: str, quantity: int) -> str:
         if quantity <= 0:
             return "Quantity must be at least 1."
-        for ci in context.userdata.cart:
-            if ci.name.lower() == item_name.strip().lower():
-                ci.quantity = quantity
-                total = _cart_total(context.userdata.cart)
-                return f"Set {ci.name} to {quantity}. Cart total {_fmt_currency(total)}."
-        return "Item not found in cart."
+        ci = context.userdata.set_quantity(item_name, quantity)
+        if ci is None:
+            return "Item not found in cart."
+        total = context.userdata.cart_total
+        return f"Set {ci.name} to {quantity}. Cart total {_fmt_currency(total)}."
 
     @function_tool
     async def list_cart(self, context: RunContext[OrderState]) -> str:
         if not context.userdata.cart:
             return "Your cart is empty."
         parts = []
-        for ci in context.userdata.cart:
+        for ci in context.userdata.cart.values():
             d = f"{_qty_word(ci.quantity)} {ci.name}"
             if ci.notes:
                 d += f" ({ci.notes})"
             d += f" @ {_fmt_currency(ci.price)}"
             parts.append(d)
-        total = _cart_total(context.userdata.cart)
+        total = context.userdata.cart_total
         return f"Items: {', '.join(parts)}. Total {_fmt_currency(total)}."
 
     @function_tool
     async def add_recipe_items(self, context: RunContext[OrderState], recipe: str, servings: int = 1) -> str:
         rec = recipe.strip().lower()
-        mapping = {
-            "masala chai": ["Tea Leaves", "Milk", "Sugar", "Cardamom Pods"],
-            "dal": ["Toor Dal", "Turmeric Powder", "Cumin Seeds", "Ghee"],
-            "paneer curry": ["Paneer", "Tomato Puree", "Onion", "Garam Masala", "Ginger Garlic Paste"],
-            "biryani": ["Basmati Rice", "Biryani Masala", "Mixed Vegetables"],
-            "roti": ["Atta (Wheat Flour)", "Ghee"],
-            "poha": ["Poha (Flattened Rice)", "Peanuts", "Mustard Seeds", "Green Chilies", "Onion"],
-        }
-        items = mapping.get(rec)
+        items = _RECIPES.get(rec)
         if not items:
             return "Recipe not found."
         added = []
+        qty = max(1, servings)
         for name in items:
-            item = _find_item(context.userdata.catalog, name)
+            item = _find_item(context.userdata.catalog_index, name)
             if item:
-                qty = max(1, servings)
-                exists = False
-                for ci in context.userdata.cart:
-                    if ci.name.lower() == item["name"].lower():
-                        ci.quantity += qty
-                        exists = True
-                        break
-                if not exists:
-                    context.userdata.cart.append(
-                        CartItem(
-                            name=item["name"],
-                            price=float(item["price"]),
-                            quantity=qty,
-                            category=item.get("category"),
-                        )
-                    )
+                context.userdata.add_to_cart(item, qty)
                 added.append(f"{item['name']} x{qty}")
-        total = _cart_total(context.userdata.cart)
+        total = context.userdata.cart_total
         return f"Added {', '.join(added)}. Cart total {_fmt_currency(total)}."
 
     @function_tool
@@ -227,9 +254,9 @@ class Assistant(Agent):
                 "notes": ci.notes,
                 "category": ci.category,
             }
-            for ci in context.userdata.cart
+            for ci in context.userdata.cart.values()
         ]
-        total = round(_cart_total(context.userdata.cart), 2)
+        total = round(context.userdata.cart_total, 2)
         order = {
             "customer_name": context.userdata.customer_name,
             "customer_address": context.userdata.customer_address,
@@ -237,25 +264,37 @@ class Assistant(Agent):
             "total": total,
             "currency": "INR",
         }
-        with open(ORDER_PATH, "w", encoding="utf-8") as f:
-            json.dump(order, f, indent=2)
+        await asyncio.to_thread(_write_order, order)
         return f"Order placed. {len(items)} items, total {_fmt_currency(total)}. Saved."
 
 def prewarm(proc: JobProcess):
     proc.userdata["vad"] = silero.VAD.load()
+    proc.userdata["stt"] = deepgram.STT(model="nova-3")
+    proc.userdata["llm"] = google.LLM(model="gemini-2.5-flash")
+    proc.userdata["tts"] = murf.TTS(
+        voice="en-IN-Isha",
+        style="Conversation",
+        tokenizer=tokenize.basic.SentenceTokenizer(min_sentence_len=2),
+        text_pacing=True,
+    )
+    # Parsed once per worker process; sessions share these and must treat them as read-only.
+    catalog = _load_catalog()
+    proc.userdata["catalog"] = catalog
+    proc.userdata["catalog_indexes"] = _index_catalog(catalog)
 
 async def entrypoint(ctx: JobContext):
     ctx.log_context_fields = {"room": ctx.room.name}
-    state = OrderState(catalog=_load_catalog())
+    catalog_index, category_index, tag_index = ctx.proc.userdata["catalog_indexes"]
+    state = OrderState(
+        catalog=ctx.proc.userdata["catalog"],
+        catalog_index=catalog_index,
+        category_index=category_index,
+        tag_index=tag_index,
+    )
     session = AgentSession[OrderState](
-        stt=deepgram.STT(model="nova-3"),
-        llm=google.LLM(model="gemini-2.5-flash"),
-        tts=murf.TTS(
-            voice="en-IN-Isha",
-            style="Conversation",
-            tokenizer=tokenize.basic.SentenceTokenizer(min_sentence_len=2),
-            text_pacing=True,
-        ),
+        stt=ctx.proc.userdata["stt"],
+        llm=ctx.proc.userdata["llm"],
+        tts=ctx.proc.userdata["tts"],
         turn_detection=MultilingualModel(),
         vad=ctx.proc.userdata["vad"],
         preemptive_generation=True,